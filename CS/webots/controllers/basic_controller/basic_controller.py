@@ -15,14 +15,18 @@ import time
 import random
 import logging
 import sys
+import os
 import heapq
+from collections import deque
 from controller import Supervisor  # type: ignore
+from recorder import FlightRecorder, RECV_COMMAND, RECV_STATUS, SENT
+from fleet_state import FleetState, FLAG_EMERGENCY, NO_CELL
 
 #  Logging configuratie 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(), logging.FileHandler("robot_controller.log")]
+    handlers=[logging.StreamHandler(), logging.FileHandler("robot_controller.log", delay=True)]
 )
 logger = logging.getLogger("RobotController")
 
@@ -44,6 +48,16 @@ START_POS = [0.0, 0.0, 0.0]
 ROBOT_SAFETY_MARGIN = 2  
 PREDICTION_STEPS = 3 
 ROBOT_PROXIMITY_THRESHOLD = 0.25
+ROBOT_STALE_AFTER = 5  # Seconden waarna de positie van een andere robot verouderd is
+BLOCKED_WAIT_TICKS = 5  # Maximaal aantal ticks wachten op rijdende robots die het doel afsluiten
+
+# Opname en herhaling (zie replay.py)
+RECORD_PATH = os.environ.get("ROBOT_RECORD_PATH")  # Bijv. "bot1.rec" om verkeer en posities op te nemen
+RANDOM_SEED = int(os.environ.get("ROBOT_SEED", random.randrange(2**32)))
+rng = random.Random(RANDOM_SEED)
+
+# Gedeelde vlootstatus voor robots op dezelfde machine (zie fleet_state.py)
+FLEET_SHM_NAME = os.environ.get("ROBOT_FLEET_SHM")  # Bijv. "cs_fleet"; zelfde naam voor alle lokale controllers
 
 #  Griddefinitie (1 = pad, 0 = muur) 
 GRID = [
@@ -60,11 +74,13 @@ GRID = [
 ]
 GRID_HEIGHT = len(GRID)
 GRID_WIDTH = len(GRID[0])
+# Versie van het grid; afgeleide kaarten worden eenmalig per versie berekend
+GRID_VERSION = 0
 
 # Willekeurige startdoelpositie binnen grenzen
 TARGET_POS = [
-    round(random.uniform(0.3, 0.7), 1),
-    round(random.uniform(0.3, 0.7), 1)
+    round(rng.uniform(0.3, 0.7), 1),
+    round(rng.uniform(0.3, 0.7), 1)
 ]
 
 # Bijhouden laatste doelpositie voor noodstop herstel
@@ -79,7 +95,35 @@ other_robots = {}
 # Robot ID
 ROBOT_ID = "bot1"  # Verander dit naar "bot1", "bot2", of "bot3" voor verschillende robots
 
-logger.info("Configuratie: START_POS=%s, TARGET_POS=%s, ROBOT_ID=%s", START_POS, TARGET_POS, ROBOT_ID)
+logger.info("Configuratie: START_POS=%s, TARGET_POS=%s, ROBOT_ID=%s, RANDOM_SEED=%d",
+            START_POS, TARGET_POS, ROBOT_ID, RANDOM_SEED)
+
+#  Opname starten 
+recorder = None
+if RECORD_PATH:
+    try:
+        recorder = FlightRecorder(RECORD_PATH, RANDOM_SEED, ROBOT_ID, time.time())
+        logger.info("Opname gestart naar %s", RECORD_PATH)
+    except OSError as e:
+        logger.error("Fout bij starten opname: %s", e)
+
+def record(write, *args):
+    # Schrijf naar de opname; een schrijffout (bijv. volle schijf) mag de MQTT-thread of hoofdlus niet stoppen
+    try:
+        write(*args)
+    except (OSError, ValueError) as e:
+        logger.error("Fout bij schrijven opname: %s", e)
+
+#  Gedeelde vlootstatus koppelen 
+fleet = None
+# Robots waarvan de status via gedeeld geheugen binnenkomt in plaats van via MQTT
+fleet_robots = set()
+if FLEET_SHM_NAME:
+    try:
+        fleet = FleetState(FLEET_SHM_NAME, ROBOT_ID)
+        logger.info("Gekoppeld aan gedeelde vlootstatus %s (%d slots)", FLEET_SHM_NAME, fleet.slots)
+    except (OSError, ValueError) as e:
+        logger.error("Fout bij koppelen gedeelde vlootstatus: %s", e)
 
 #  Positie en rotatie instellen 
 try:
@@ -142,6 +186,12 @@ def validate_coordinates(x, y):
     x = round(x, 1)
     y = round(y, 1)
     
+    # Doel op een muur verplaatsen naar de dichtstbijzijnde vrije cel
+    gx, gy = world_to_grid(x, y)
+    free_gx, free_gy = find_closest_valid_position(GRID, (gx, gy))
+    if (free_gx, free_gy) != (gx, gy):
+        x, y = grid_to_world(free_gx, free_gy)
+    
     logger.debug("Coördinaten gevalideerd: (%f, %f) -> (%f, %f)", x, y, x, y)
     return x, y
 
@@ -168,6 +218,9 @@ def on_status(client, userdata, msg):
    # Verwerk inkomende MQTT statusberichten van andere robots
     global other_robots
     
+    if recorder:
+        record(recorder.message, RECV_STATUS, time.time(), msg.topic, msg.payload)
+
     try:
         payload = msg.payload.decode()
         status_data = json.loads(payload)
@@ -177,6 +230,8 @@ def on_status(client, userdata, msg):
             robot_id = status_data["data"].get("sender")
             if robot_id == ROBOT_ID:  # Sla eigen berichten over
                 return
+            if robot_id in fleet_robots:  # Lokale robot, verser via gedeeld geheugen
+                return
                 
             location = status_data["data"]["msg"].get("location")
             if location:
@@ -197,8 +252,11 @@ def on_command(client, userdata, msg):
     - RESUME: Zet noodstop uit
     - MOVE: Verplaats naar nieuwe positie (als er geen noodstop actief is)
     """
-    global TARGET_POS, emergency_stop, LAST_TARGET_POS, path_cache
+    global TARGET_POS, emergency_stop, LAST_TARGET_POS, path_cache, path_abstract
     
+    if recorder:
+        record(recorder.message, RECV_COMMAND, time.time(), msg.topic, msg.payload)
+
     try:
         logger.info("MQTT bericht ontvangen op %s", msg.topic)
         # Bericht decoderen en parsen
@@ -241,11 +299,12 @@ def on_command(client, userdata, msg):
                 # Herstel de laatste doelpositie indien beschikbaar
                 if LAST_TARGET_POS is not None:
                     logger.info(f"Beweging naar laatste doel hervatten: ({LAST_TARGET_POS[0]}, {LAST_TARGET_POS[1]})")
-                    TARGET_POS = LAST_TARGET_POS
+                    TARGET_POS = list(validate_coordinates(*LAST_TARGET_POS))
                     LAST_TARGET_POS = None
                     
                     # Leeg pad cache om herberekening van pad te forceren
                     path_cache = []
+                    path_abstract = []
                 return
                 
             # Verwerk MOVE commando (alleen als er geen noodstop actief is)
@@ -261,6 +320,7 @@ def on_command(client, userdata, msg):
                         TARGET_POS = [x, y]
                         # Leeg pad cache bij wijziging van doel
                         path_cache = []
+                        path_abstract = []
                     except ValueError as ve:
                         logger.error("Ongeldige coördinaten in MOVE commando: %s", ve)
     except json.JSONDecodeError as je:
@@ -280,6 +340,43 @@ if mqtt_connected:
 # Bijhouden van laatste verzonden positie
 last_sent_position = None
 
+#  Gedeelde vlootstatus 
+def merge_fleet_state(entries):
+    """
+    Neem de status van lokale robots uit gedeeld geheugen over in other_robots.
+    Hun volgende cel wordt meegenomen als zekere voorspelling.
+    """
+    global fleet_robots
+    
+    for robot_id, x, y, next_gx, next_gy, flags, timestamp in entries:
+        other_robots[robot_id] = {
+            "x": x,
+            "y": y,
+            "timestamp": timestamp,
+            "next": (next_gx, next_gy) if next_gx != NO_CELL else None,
+            "emergency": bool(flags & FLAG_EMERGENCY)
+        }
+    fleet_robots = {entry[0] for entry in entries}
+
+def read_fleet_state(current_time):
+    # Lees de status van lokale robots vlak voor de padbeslissing
+    try:
+        entries = fleet.read(current_time, ROBOT_STALE_AFTER)
+        if recorder:
+            record(recorder.fleet, current_time, entries)
+        merge_fleet_state(entries)
+    except Exception as e:
+        logger.error("Fout bij lezen gedeelde vlootstatus: %s", e)
+
+def publish_fleet_state(current_time):
+    # Schrijf eigen positie, volgende cel en noodstop naar gedeeld geheugen
+    try:
+        pos = trans.getSFVec3f()
+        fleet.publish(round(pos[0], 1), round(pos[1], 1), path_cache[0] if path_cache else None,
+                      FLAG_EMERGENCY if emergency_stop else 0, current_time)
+    except Exception as e:
+        logger.error("Fout bij schrijven gedeelde vlootstatus: %s", e)
+
 #  Detecteer obstakels met sensoren 
 def detect_obstacles():
     """
@@ -364,6 +461,8 @@ def send_status():
             # Naar JSON en versturen
             payload = json.dumps(status_message)
             client.publish(TOPIC_PUBLISH, payload)
+            if recorder:
+                record(recorder.message, SENT, current_time, TOPIC_PUBLISH, payload)
             logger.info("Statusbericht verzonden: positie=(%f, %f), noodstop=%s",
                        x_pos, y_pos, emergency_stop)
     except Exception as e:
@@ -401,6 +500,41 @@ def set_position(x, y):
 def heuristic(a, b):
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
+#  Kaart met dichtstbijzijnde vrije cel per gridcel 
+nearest_free_cache = {"version": None, "cells": None}
+
+def nearest_free_map():
+    """
+    Geef voor elke gridcel de index (y * GRID_WIDTH + x) van de dichtstbijzijnde
+    vrije cel (Manhattan-afstand via het grid). Wordt eenmalig per gridversie
+    berekend met een BFS vanuit alle vrije cellen tegelijk.
+    """
+    if nearest_free_cache["version"] == GRID_VERSION:
+        return nearest_free_cache["cells"]
+    
+    cells = [-1] * (GRID_WIDTH * GRID_HEIGHT)
+    queue = deque()
+    for y in range(GRID_HEIGHT):
+        for x in range(GRID_WIDTH):
+            if GRID[y][x] == 1:
+                index = y * GRID_WIDTH + x
+                cells[index] = index
+                queue.append((x, y))
+    
+    # Breid vrije gebieden laag voor laag uit over de muren
+    while queue:
+        x, y = queue.popleft()
+        source = cells[y * GRID_WIDTH + x]
+        for nx, ny in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+            if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT and cells[ny * GRID_WIDTH + nx] == -1:
+                cells[ny * GRID_WIDTH + nx] = source
+                queue.append((nx, ny))
+    
+    nearest_free_cache["version"] = GRID_VERSION
+    nearest_free_cache["cells"] = cells
+    logger.debug("Kaart met dichtstbijzijnde vrije cellen berekend voor gridversie %d", GRID_VERSION)
+    return cells
+
 #  Zoek dichtsbijzijnde valide positie 
 def find_closest_valid_position(grid, pos):
     # Vind de dichtstbijzijnde geldige positie in het grid
@@ -409,17 +543,27 @@ def find_closest_valid_position(grid, pos):
     # Als de positie al geldig is, retourneer deze
     if 0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT and grid[y][x] == 1:
         return pos
-        
-    # Zoek in uitbreidende vierkanten rond de positie
-    for radius in range(1, max(GRID_WIDTH, GRID_HEIGHT)):
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                # Alleen posities op de rand van het vierkant controleren
-                if abs(dx) == radius or abs(dy) == radius:
-                    nx, ny = x + dx, y + dy
-                    if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT and grid[ny][nx] == 1:
-                        logger.info(f"Positie aangepast van ({x}, {y}) naar ({nx}, {ny})")
-                        return (nx, ny)
+    
+    # Voor het actuele grid: directe opzoeking in de voorberekende kaart
+    if grid is GRID:
+        cx = min(max(x, 0), GRID_WIDTH - 1)
+        cy = min(max(y, 0), GRID_HEIGHT - 1)
+        index = nearest_free_map()[cy * GRID_WIDTH + cx]
+        if index != -1:
+            nx, ny = index % GRID_WIDTH, index // GRID_WIDTH
+            logger.info(f"Positie aangepast van ({x}, {y}) naar ({nx}, {ny})")
+            return (nx, ny)
+    else:
+        # Ander grid (bijv. met robotmarkeringen): zoek in uitbreidende vierkanten
+        for radius in range(1, max(GRID_WIDTH, GRID_HEIGHT)):
+            for dx in range(-radius, radius + 1):
+                for dy in range(-radius, radius + 1):
+                    # Alleen posities op de rand van het vierkant controleren
+                    if abs(dx) == radius or abs(dy) == radius:
+                        nx, ny = x + dx, y + dy
+                        if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT and grid[ny][nx] == 1:
+                            logger.info(f"Positie aangepast van ({x}, {y}) naar ({nx}, {ny})")
+                            return (nx, ny)
                         
     # Als geen geldige positie gevonden, gebruik centrum van het grid als fallback
     logger.warning(f"Geen geldige positie gevonden bij ({x}, {y}), centrum van grid gebruikt")
@@ -439,7 +583,49 @@ def grid_to_world(gx, gy):
     y = round((GRID_HEIGHT - 1 - gy) * STEP_SIZE, 1)
     return x, y
 
+# Willekeurige startdoelpositie kan op een muur liggen; eenmalig naar een vrije cel verplaatsen
+TARGET_POS = list(validate_coordinates(*TARGET_POS))
+
+#  Grid vervangen 
+def set_grid(grid):
+    """
+    Vervang het grid (bijv. een andere arena) en pas afmetingen en grenzen aan.
+    Verhoogt GRID_VERSION zodat afgeleide kaarten opnieuw berekend worden.
+    """
+    global GRID, GRID_HEIGHT, GRID_WIDTH, MAX_BOUND, GRID_VERSION, TARGET_POS, path_cache, path_abstract
+    GRID = grid
+    GRID_HEIGHT = len(grid)
+    GRID_WIDTH = len(grid[0])
+    MAX_BOUND = round((max(GRID_WIDTH, GRID_HEIGHT) - 1) * STEP_SIZE, 1)
+    GRID_VERSION += 1
+    # Doel kan in het nieuwe grid op een muur liggen
+    TARGET_POS = list(validate_coordinates(*TARGET_POS))
+    path_cache = []
+    path_abstract = []
+    logger.info("Nieuw grid geladen: %dx%d (versie %d)", GRID_WIDTH, GRID_HEIGHT, GRID_VERSION)
+
 #  Markeer robot-obstakels op grid 
+def robot_obstacle_cells(other_robot_positions):
+    # Verzamel gridcellen die bezet zijn door andere robots, inclusief veiligheidsmarge
+    cells = set()
+    for robot_id, pos_data in other_robot_positions.items():
+        # Zet wereldcoördinaten om naar grid
+        rx, ry = world_to_grid(pos_data["x"], pos_data["y"])
+        
+        # Controleer of coördinaten binnen grid vallen
+        if 0 <= rx < GRID_WIDTH and 0 <= ry < GRID_HEIGHT:
+            # Voeg een veiligheidsmarge toe rond robots
+            for dx in range(-ROBOT_SAFETY_MARGIN, ROBOT_SAFETY_MARGIN + 1):
+                for dy in range(-ROBOT_SAFETY_MARGIN, ROBOT_SAFETY_MARGIN + 1):
+                    # Alleen blokkeren als binnen veiligheidsafstand (Manhattan distance)
+                    if abs(dx) + abs(dy) <= ROBOT_SAFETY_MARGIN:
+                        nx, ny = rx + dx, ry + dy
+                        # Alleen blokkeren als binnen grid grenzen
+                        if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT:
+                            cells.add((nx, ny))
+            logger.debug("Cellen rond (%d,%d) gemarkeerd als bezet door/nabij robot %s", rx, ry, robot_id)
+    return cells
+
 def mark_robot_obstacles(grid, other_robot_positions):
     # Markeer gridcellen die bezet zijn door andere robots en voeg veiligheidsmarges toe
     # Maak een tijdelijk grid
@@ -447,25 +633,249 @@ def mark_robot_obstacles(grid, other_robot_positions):
     
     # Markeer cellen met andere robots als obstakels
     if other_robot_positions:
-        for robot_id, pos_data in other_robot_positions.items():
-            # Zet wereldcoördinaten om naar grid
-            rx, ry = world_to_grid(pos_data["x"], pos_data["y"])
-            
-            # Controleer of coördinaten binnen grid vallen
-            if 0 <= rx < GRID_WIDTH and 0 <= ry < GRID_HEIGHT:
-                # Voeg een veiligheidsmarge toe rond robots
-                for dx in range(-ROBOT_SAFETY_MARGIN, ROBOT_SAFETY_MARGIN + 1):
-                    for dy in range(-ROBOT_SAFETY_MARGIN, ROBOT_SAFETY_MARGIN + 1):
-                        # Alleen blokkeren als binnen veiligheidsafstand (Manhattan distance)
-                        if abs(dx) + abs(dy) <= ROBOT_SAFETY_MARGIN:
-                            nx, ny = rx + dx, ry + dy
-                            # Alleen blokkeren als binnen grid grenzen
-                            if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT:
-                                temp_grid[ny][nx] = 0  # Markeer als obstakel
-                                logger.debug(f"Cel ({nx},{ny}) gemarkeerd als bezet door/nabij robot {robot_id}")
+        for nx, ny in robot_obstacle_cells(other_robot_positions):
+            temp_grid[ny][nx] = 0
     
     return temp_grid
 
+#  Verbindingsindex over de vrije ruimte 
+# Maximaal aantal gecachete robotmarkeringen (per tick: voorspeld, huidig)
+CONNECTIVITY_CACHE_SIZE = 4
+# Rand rond een markering waarbinnen lokaal gezocht wordt naar een omweg
+CONNECTIVITY_LOCAL_MARGIN = 2 * ROBOT_SAFETY_MARGIN + 1
+# Geschatte kosten (in gridcellen) van het labelen van één robotmarkering: het
+# gebied rond de markering dat lokaal op een omweg doorzocht wordt
+CONNECTIVITY_STAMP_COST = (2 * (ROBOT_SAFETY_MARGIN + CONNECTIVITY_LOCAL_MARGIN) + 1) ** 2
+connectivity_cache = {"version": None, "labels": None, "count": 0, "sizes": [], "stamped": {}}
+
+def _grid_neighbors(index):
+    # Gridindices van de vier buren binnen het grid
+    x, y = index % GRID_WIDTH, index // GRID_WIDTH
+    if x + 1 < GRID_WIDTH:
+        yield index + 1
+    if x > 0:
+        yield index - 1
+    if y + 1 < GRID_HEIGHT:
+        yield index + GRID_WIDTH
+    if y > 0:
+        yield index - GRID_WIDTH
+
+def _label_cells(cells, labels, next_label):
+    # BFS-labeling: elke 4-verbonden groep uit `cells` krijgt een eigen label
+    pending = set(cells)
+    while pending:
+        start = pending.pop()
+        labels[start] = next_label
+        queue = deque([start])
+        while queue:
+            for neighbor in _grid_neighbors(queue.popleft()):
+                if neighbor in pending:
+                    pending.discard(neighbor)
+                    labels[neighbor] = next_label
+                    queue.append(neighbor)
+        next_label += 1
+    return next_label
+
+def static_components():
+    """
+    Componentlabels van de vrije cellen in GRID (index y * GRID_WIDTH + x,
+    -1 voor muren) en het aantal componenten. Eenmalig per gridversie; het
+    aantal cellen per component staat in connectivity_cache["sizes"].
+    """
+    if connectivity_cache["version"] != GRID_VERSION:
+        labels = [-1] * (GRID_WIDTH * GRID_HEIGHT)
+        free = [i for i in range(len(labels)) if GRID[i // GRID_WIDTH][i % GRID_WIDTH] == 1]
+        count = _label_cells(free, labels, 0)
+        sizes = [0] * count
+        for index in free:
+            sizes[labels[index]] += 1
+        connectivity_cache.update(version=GRID_VERSION, labels=labels, count=count, sizes=sizes, stamped={})
+        logger.debug("Verbindingsindex berekend: %d componenten (gridversie %d)", count, GRID_VERSION)
+    return connectivity_cache["labels"], connectivity_cache["count"]
+
+def _stamp_splits_component(labels, overrides, label, boundary, blob):
+    """
+    Lokale controle of een zojuist geblokkeerde markering (`blob`) haar
+    component kan splitsen: als alle vrije buren binnen een kleine rand rond de
+    markering onderling verbonden blijven, splitst ze niets. Zonder lokale
+    omweg is het antwoord True en zoekt _separate_pieces de afgesplitste delen.
+    """
+    remaining = set(boundary)
+    start = remaining.pop()
+    if not remaining:
+        return False
+    
+    xs = [index % GRID_WIDTH for index in blob]
+    ys = [index // GRID_WIDTH for index in blob]
+    min_x, max_x = min(xs) - CONNECTIVITY_LOCAL_MARGIN, max(xs) + CONNECTIVITY_LOCAL_MARGIN
+    min_y, max_y = min(ys) - CONNECTIVITY_LOCAL_MARGIN, max(ys) + CONNECTIVITY_LOCAL_MARGIN
+    
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        for neighbor in _grid_neighbors(queue.popleft()):
+            x, y = neighbor % GRID_WIDTH, neighbor // GRID_WIDTH
+            if (neighbor not in seen and min_x <= x <= max_x and min_y <= y <= max_y
+                    and overrides.get(neighbor, labels[neighbor]) == label):
+                seen.add(neighbor)
+                queue.append(neighbor)
+                remaining.discard(neighbor)
+                if not remaining:
+                    return False
+    return True
+
+def _separate_pieces(labels, overrides, label, starts, next_label):
+    """
+    Vind de delen waarin component `label` uiteenvalt met verweven
+    BFS-zoekacties vanuit `starts` (de vrije buren van één markering), een stap
+    per zoekactie per ronde. Zoekacties die elkaar raken worden samengevoegd;
+    een zoekactie die opraakt heeft een volledig deel gevonden en dat krijgt
+    een nieuw label. Zodra er nog één actieve zoekactie over is, stopt het
+    zoeken: dat (grootste) deel houdt zijn label. De kosten zijn zo begrensd
+    door de kleinere delen. Geeft next_label terug.
+    """
+    owner = {}
+    parent = list(range(len(starts)))
+    frontiers = [deque() for _ in starts]
+    visited = [[] for _ in starts]
+    
+    def find(search):
+        while parent[search] != search:
+            parent[search] = parent[parent[search]]
+            search = parent[search]
+        return search
+    
+    for search, cell in enumerate(starts):
+        if cell in owner:
+            parent[search] = find(owner[cell])
+            continue
+        owner[cell] = search
+        frontiers[search].append(cell)
+        visited[search].append(cell)
+    
+    finished = set()
+    active = {find(search) for search in range(len(starts))}
+    while len(active) > 1:
+        for search in active:
+            if find(search) != search or search in finished:
+                continue
+            if not frontiers[search]:
+                # Deel volledig doorzocht: nieuw label
+                for cell in visited[search]:
+                    overrides[cell] = next_label
+                next_label += 1
+                finished.add(search)
+                continue
+            for neighbor in _grid_neighbors(frontiers[search].popleft()):
+                if overrides.get(neighbor, labels[neighbor]) != label:
+                    continue
+                other = owner.get(neighbor)
+                if other is None:
+                    owner[neighbor] = search
+                    frontiers[search].append(neighbor)
+                    visited[search].append(neighbor)
+                elif find(other) != search:
+                    # Zoekacties raken elkaar: zelfde deel, samenvoegen
+                    merged = find(other)
+                    parent[merged] = search
+                    frontiers[search].extend(frontiers[merged])
+                    visited[search].extend(visited[merged])
+                    frontiers[merged] = deque()
+                    visited[merged] = []
+        active = {find(search) for search in active} - finished
+    
+    return next_label
+
+def component_overrides(blocked):
+    """
+    Wijzigingen op de statische componentlabels wanneer `blocked` (set van
+    gridindices, bijv. robotmarkeringen) als obstakel telt: {index: label},
+    met -1 voor gemarkeerde cellen. Markeringen worden blob voor blob
+    toegevoegd; alleen een blob die zijn component kan splitsen leidt tot een
+    (lokale) zoektocht naar afgesplitste delen. De uitkomst wordt per
+    markeringsset gecachet zolang robots niet bewegen.
+    """
+    labels, next_label = static_components()
+    key = frozenset(blocked)
+    stamped = connectivity_cache["stamped"]
+    if key in stamped:
+        return stamped[key]
+    
+    overrides = {}
+    
+    # Markeringen opdelen in aaneengesloten blobs van vrije cellen
+    blob_ids = {}
+    _label_cells([index for index in key if labels[index] >= 0], blob_ids, 0)
+    blobs = {}
+    for index, blob in blob_ids.items():
+        blobs.setdefault(blob, []).append(index)
+    
+    for blob in blobs.values():
+        label = overrides.get(blob[0], labels[blob[0]])
+        for index in blob:
+            overrides[index] = -1
+        boundary = {n for index in blob for n in _grid_neighbors(index) if overrides.get(n, labels[n]) == label}
+        if boundary and _stamp_splits_component(labels, overrides, label, boundary, blob):
+            next_label = _separate_pieces(labels, overrides, label, list(boundary), next_label)
+    
+    if len(stamped) >= CONNECTIVITY_CACHE_SIZE:
+        stamped.pop(next(iter(stamped)))
+    stamped[key] = overrides
+    return overrides
+
+def is_reachable(start, goal, other_robot_positions=None):
+    """
+    Controleer in constante tijd (na labeling) of goal vanaf start bereikbaar is.
+    Start en doel tellen, net als in dijkstra, altijd als vrij.
+    """
+    if start == goal or heuristic(start, goal) == 1:
+        return True
+    
+    labels, overrides = _stamped_labels(other_robot_positions)
+    return not _endpoint_labels(start, labels, overrides).isdisjoint(_endpoint_labels(goal, labels, overrides))
+
+def _stamped_labels(other_robot_positions):
+    # Statische labels en de wijzigingen daarop door robotmarkeringen
+    labels, _ = static_components()
+    overrides = {}
+    if other_robot_positions:
+        overrides = component_overrides({y * GRID_WIDTH + x for x, y in robot_obstacle_cells(other_robot_positions)})
+    return labels, overrides
+
+def _endpoint_labels(cell, labels, overrides):
+    # Label van de cel zelf, of van de vrije buren als de cel geblokkeerd is
+    index = cell[1] * GRID_WIDTH + cell[0]
+    label = overrides.get(index, labels[index])
+    if label >= 0:
+        return {label}
+    return {overrides.get(n, labels[n]) for n in _grid_neighbors(index)} - {-1}
+
+def closest_reachable_cell(start, goal, other_robot_positions=None):
+    """
+    Dichtstbijzijnde cel bij goal (Manhattan-afstand) die vanaf start
+    bereikbaar is, zoals het gedeeltelijke pad van dijkstra, maar via een BFS
+    rond het doel in plaats van een zoektocht over het hele bereikbare gebied.
+    Geeft None als start zelf de dichtstbijzijnde cel is.
+    """
+    labels, overrides = _stamped_labels(other_robot_positions)
+    start_labels = _endpoint_labels(start, labels, overrides)
+    start_index = start[1] * GRID_WIDTH + start[0]
+    goal_index = goal[1] * GRID_WIDTH + goal[0]
+    
+    seen = {goal_index}
+    queue = deque([goal_index])
+    while queue:
+        index = queue.popleft()
+        if index == start_index:
+            return None
+        if overrides.get(index, labels[index]) in start_labels:
+            return index % GRID_WIDTH, index // GRID_WIDTH
+        for neighbor in _grid_neighbors(index):
+            if neighbor not in seen:
+                seen.add(neighbor)
+                queue.append(neighbor)
+    return None
+
 #  Voorspel toekomstige robotposities 
 def predict_robot_positions(robot_positions, prediction_steps=PREDICTION_STEPS):
     """
@@ -509,8 +919,8 @@ def predict_robot_positions(robot_positions, prediction_steps=PREDICTION_STEPS):
                     future_y = current_y + dy * step
                     
                     # Zorg voor geldige coördinaten
-                    future_x = min(max(future_x, 0.0), 0.9)
-                    future_y = min(max(future_y, 0.0), 0.9)
+                    future_x = min(max(future_x, MIN_BOUND), MAX_BOUND)
+                    future_y = min(max(future_y, MIN_BOUND), MAX_BOUND)
                     
                     # Voeg voorspelde positie toe
                     key = f"{robot_id}_pred_{step}"
@@ -520,11 +930,26 @@ def predict_robot_positions(robot_positions, prediction_steps=PREDICTION_STEPS):
                         "timestamp": robot_positions[robot_id]["timestamp"]
                     }
     
+    # Volgende cel van lokale robots is bekend (gedeeld geheugen) in plaats van geschat
+    for robot_id, pos_data in robot_positions.items():
+        if pos_data.get("next"):
+            next_x, next_y = grid_to_world(*pos_data["next"])
+            predicted_positions[f"{robot_id}_next"] = {
+                "x": next_x,
+                "y": next_y,
+                "timestamp": pos_data["timestamp"]
+            }
+    
     # Combineer huidige en voorspelde posities
     combined = robot_positions.copy()
     combined.update(predicted_positions)
     return combined
 
+def robots_moving():
+    # True als een andere robot sinds de vorige tick van positie veranderde (geschiedenis van de voorspelling)
+    history = getattr(predict_robot_positions, "history", {})
+    return any(len(positions) >= 2 and positions[-1] != positions[-2] for positions in history.values())
+
 #  Dijkstra padzoekalgoritme met robotvermijding 
 def dijkstra(grid, start, goal, other_robot_positions=None):
     """
@@ -623,16 +1048,321 @@ def dijkstra(grid, start, goal, other_robot_positions=None):
     path.reverse()
     return path
 
+#  Hiërarchische padplanning (HPA*) voor grote kaarten 
+# Zijde van een cluster in gridcellen
+HPA_CLUSTER_SIZE = 16
+# Vanaf deze Manhattan-afstand tussen start en doel hiërarchisch plannen, daaronder dijkstra
+HPA_MIN_DISTANCE = 2 * HPA_CLUSTER_SIZE
+# Aantal abstracte stukken dat per keer naar gridcellen wordt verfijnd
+HPA_REFINE_LEGS = 4
+# Bijverfijnen zodra path_cache korter is dan dit, zodat de botsingscontrole vooruit blijft kijken
+HPA_REFILL_CELLS = HPA_CLUSTER_SIZE
+# Ingangen van minstens deze breedte krijgen een overgang aan beide uiteinden in plaats van in het midden
+HPA_WIDE_ENTRANCE = 6
+# Maximaal aantal gecachete clustergrafen met robotmarkeringen
+HPA_STAMPED_CACHE_SIZE = 1024
+hpa_cache = {"version": None, "graphs": {}, "stamped": {}}
+
+def _cluster_of(cell):
+    return cell[0] // HPA_CLUSTER_SIZE, cell[1] // HPA_CLUSTER_SIZE
+
+def _cluster_bounds(cluster):
+    # (x0, x1, y0, y1) van een cluster, x1 en y1 exclusief
+    cx, cy = cluster
+    return (cx * HPA_CLUSTER_SIZE, min((cx + 1) * HPA_CLUSTER_SIZE, GRID_WIDTH),
+            cy * HPA_CLUSTER_SIZE, min((cy + 1) * HPA_CLUSTER_SIZE, GRID_HEIGHT))
+
+def _boundary_transitions(cluster, side, blocked):
+    """
+    Overgangen van `cluster` naar de buurcluster rechts (side "E") of eronder
+    (side "S") als lijst van (cel in cluster, cel in buurcluster). Elke
+    aaneengesloten reeks vrije celparen over de grens is een ingang met één
+    overgang in het midden, of twee aan de uiteinden als de ingang breed is.
+    """
+    x0, x1, y0, y1 = _cluster_bounds(cluster)
+    if side == "E":
+        if x1 >= GRID_WIDTH:
+            return []
+        pairs = [((x1 - 1, y), (x1, y)) for y in range(y0, y1)]
+    else:
+        if y1 >= GRID_HEIGHT:
+            return []
+        pairs = [((x, y1 - 1), (x, y1)) for x in range(x0, x1)]
+    
+    transitions = []
+    run = []
+    for a, b in pairs + [(None, None)]:
+        if (a is not None and GRID[a[1]][a[0]] == 1 and GRID[b[1]][b[0]] == 1
+                and a not in blocked and b not in blocked):
+            run.append((a, b))
+            continue
+        if len(run) >= HPA_WIDE_ENTRANCE:
+            transitions += [run[0], run[-1]]
+        elif run:
+            transitions.append(run[len(run) // 2])
+        run = []
+    return transitions
+
+def _cluster_cells(cluster, blocked):
+    """
+    Vrije cellen van een cluster met lokale indices: (lijst van cellen,
+    {cel: index}, burenlijst per index). Basis voor de BFS'en binnen het cluster.
+    """
+    x0, x1, y0, y1 = _cluster_bounds(cluster)
+    cells = [(x, y) for y in range(y0, y1) for x in range(x0, x1)
+             if GRID[y][x] == 1 and (x, y) not in blocked]
+    index_of = {cell: index for index, cell in enumerate(cells)}
+    neighbors = [[index_of[n] for n in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)) if n in index_of]
+                 for x, y in cells]
+    return cells, index_of, neighbors
+
+def _local_distances(neighbors, source, targets=None):
+    # BFS-afstanden (lijst, -1 = onbereikbaar); stopt zodra alle `targets` gevonden zijn
+    distances = [-1] * len(neighbors)
+    distances[source] = 0
+    remaining = set(targets) - {source} if targets is not None else None
+    if remaining is not None and not remaining:
+        return distances
+    queue = [source]
+    for current in queue:
+        step = distances[current] + 1
+        for neighbor in neighbors[current]:
+            if distances[neighbor] < 0:
+                distances[neighbor] = step
+                queue.append(neighbor)
+                if remaining is not None and neighbor in remaining:
+                    remaining.discard(neighbor)
+                    if not remaining:
+                        return distances
+    return distances
+
+def _cluster_distances(cluster, source, blocked):
+    # BFS-afstanden vanaf de vrije cel `source` naar alle bereikbare cellen binnen het cluster
+    cells, index_of, neighbors = _cluster_cells(cluster, blocked)
+    distances = _local_distances(neighbors, index_of[source])
+    return {cells[index]: distance for index, distance in enumerate(distances) if distance >= 0}
+
+def _cluster_route(cluster, start, goal, blocked):
+    # Kortste route binnen het cluster (zonder start, met doel), of None
+    x0, x1, y0, y1 = _cluster_bounds(cluster)
+    came_from = {start: None}
+    queue = deque([start])
+    while queue:
+        current = queue.popleft()
+        if current == goal:
+            route = []
+            while current != start:
+                route.append(current)
+                current = came_from[current]
+            route.reverse()
+            return route
+        x, y = current
+        for nx, ny in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+            if (x0 <= nx < x1 and y0 <= ny < y1 and (nx, ny) not in came_from
+                    and GRID[ny][nx] == 1 and (nx, ny) not in blocked):
+                came_from[(nx, ny)] = current
+                queue.append((nx, ny))
+    return None
+
+def _cluster_graph(cluster, blocked):
+    """
+    Abstracte graaf van één cluster: {ingangscel: [(buur, kosten), ...]} met
+    de overgangen naar buurclusters (kosten 1) en de BFS-afstanden tussen de
+    ingangen binnen het cluster. `blocked` bevat de robotmarkeringen in en
+    direct rond het cluster.
+    """
+    cx, cy = cluster
+    transitions = _boundary_transitions(cluster, "E", blocked) + _boundary_transitions(cluster, "S", blocked)
+    if cx > 0:
+        transitions += [(b, a) for a, b in _boundary_transitions((cx - 1, cy), "E", blocked)]
+    if cy > 0:
+        transitions += [(b, a) for a, b in _boundary_transitions((cx, cy - 1), "S", blocked)]
+    
+    graph = {}
+    for a, b in transitions:
+        graph.setdefault(a, []).append((b, 1))
+    
+    # Afstanden tussen ingangen: afstanden zijn symmetrisch, dus elke BFS zoekt
+    # alleen de nog ontbrekende (latere) ingangen en stopt zodra die gevonden zijn
+    cells, index_of, neighbors = _cluster_cells(cluster, blocked)
+    entrances = list(graph)
+    local = [index_of[entrance] for entrance in entrances]
+    for i, entrance in enumerate(entrances[:-1]):
+        distances = _local_distances(neighbors, local[i], local[i + 1:])
+        for j in range(i + 1, len(entrances)):
+            distance = distances[local[j]]
+            if distance >= 0:
+                graph[entrance].append((entrances[j], distance))
+                graph[entrances[j]].append((entrance, distance))
+    return graph
+
+def _stamps_per_cluster(blocked):
+    # Verdeel markeringen over de clusters die ze raken, inclusief buurclusters langs de grens
+    per_cluster = {}
+    for x, y in blocked:
+        for nx, ny in ((x, y), (x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+            if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT:
+                per_cluster.setdefault(_cluster_of((nx, ny)), set()).add((x, y))
+    return {cluster: frozenset(cells) for cluster, cells in per_cluster.items()}
+
+def cluster_graph(cluster, stamps_per_cluster=None):
+    """
+    Gecachete abstracte graaf van een cluster. Zonder markeringen in het
+    cluster wordt de statische graaf (eenmalig per gridversie) gebruikt;
+    robotmarkeringen maken alleen de clusters ongeldig die ze raken.
+    """
+    if hpa_cache["version"] != GRID_VERSION:
+        hpa_cache.update(version=GRID_VERSION, graphs={}, stamped={})
+    
+    stamps = stamps_per_cluster.get(cluster) if stamps_per_cluster else None
+    if not stamps:
+        graphs = hpa_cache["graphs"]
+        if cluster not in graphs:
+            graphs[cluster] = _cluster_graph(cluster, frozenset())
+        return graphs[cluster]
+    
+    stamped = hpa_cache["stamped"]
+    key = (cluster, stamps)
+    if key not in stamped:
+        if len(stamped) >= HPA_STAMPED_CACHE_SIZE:
+            stamped.pop(next(iter(stamped)))
+        stamped[key] = _cluster_graph(cluster, stamps)
+    return stamped[key]
+
+def refine_path(position, nodes, legs=HPA_REFINE_LEGS, other_robot_positions=None):
+    """
+    Verfijn de eerste `legs` stukken van een abstract pad (knopen na
+    `position`) naar gridcellen. Geeft (cellen, resterende knopen) terug, of
+    None als een stuk inmiddels door robots geblokkeerd is.
+    """
+    blocked = robot_obstacle_cells(other_robot_positions) if other_robot_positions else set()
+    blocked -= {position, nodes[-1]}
+    
+    cells = []
+    current = position
+    for node in nodes[:legs]:
+        if node in blocked:
+            return None
+        if heuristic(current, node) == 1:
+            cells.append(node)
+        else:
+            route = _cluster_route(_cluster_of(node), current, node, blocked)
+            if route is None:
+                return None
+            cells.extend(route)
+        current = node
+    return cells, nodes[legs:]
+
+def hierarchical_path(start, goal, other_robot_positions=None):
+    """
+    HPA*: zoek een pad over de gecachete clustergrafen in plaats van over alle
+    cellen en verfijn alleen de eerste stukken naar gridcellen. Geeft
+    (pad, resterende abstracte knopen) terug, of None als start en doel in
+    hetzelfde cluster liggen, een van beide op een muur ligt (dijkstra laat
+    die wel toe) of er geen abstract pad is.
+    """
+    start_cluster, goal_cluster = _cluster_of(start), _cluster_of(goal)
+    if start_cluster == goal_cluster:
+        return None
+    if GRID[start[1]][start[0]] == 0 or GRID[goal[1]][goal[0]] == 0:
+        return None
+    
+    blocked = robot_obstacle_cells(other_robot_positions) if other_robot_positions else set()
+    blocked -= {start, goal}
+    stamps = _stamps_per_cluster(blocked)
+    
+    # Start en doel tijdelijk verbinden met de ingangen van hun eigen cluster
+    start_distances = _cluster_distances(start_cluster, start, blocked)
+    start_graph = cluster_graph(start_cluster, stamps)
+    start_edges = [(cell, start_distances[cell]) for cell in start_graph if cell in start_distances]
+    start_edges += start_graph.get(start, [])
+    goal_distances = _cluster_distances(goal_cluster, goal, blocked)
+    goal_edges = {cell: goal_distances[cell] for cell in cluster_graph(goal_cluster, stamps)
+                  if cell in goal_distances}
+    
+    # Bij gelijke schatting eerst de knoop met de hoogste kosten (het verst gevorderd);
+    # anders verkent A* op een open kaart alle knopen tussen start en doel
+    queue = [(heuristic(start, goal), 0, start)]
+    cost_so_far = {start: 0}
+    came_from = {}
+    while queue:
+        _, negative_cost, node = heapq.heappop(queue)
+        cost = -negative_cost
+        if node == goal:
+            break
+        if cost > cost_so_far[node]:
+            continue
+        
+        if node == start:
+            edges = start_edges
+        else:
+            edges = cluster_graph(_cluster_of(node), stamps).get(node, [])
+            if node in goal_edges:
+                edges = edges + [(goal, goal_edges[node])]
+        
+        for neighbor, step in edges:
+            new_cost = cost + step
+            if new_cost < cost_so_far.get(neighbor, new_cost + 1):
+                cost_so_far[neighbor] = new_cost
+                came_from[neighbor] = node
+                heapq.heappush(queue, (new_cost + heuristic(neighbor, goal), -new_cost, neighbor))
+    else:
+        logger.warning(f"Geen abstract pad gevonden van {start} naar {goal}")
+        return None
+    
+    nodes = []
+    node = goal
+    while node != start:
+        nodes.append(node)
+        node = came_from[node]
+    nodes.reverse()
+    logger.debug("Abstract pad met %d knopen (lengte %d)", len(nodes), cost_so_far[goal])
+    return refine_path(start, nodes, HPA_REFINE_LEGS, other_robot_positions)
+
+def plan_path(start, goal, other_robot_positions=None):
+    """
+    Plan een pad van start naar doel. Lange afstanden gaan hiërarchisch: dan
+    staat alleen het begin als cellen in het pad en de rest als abstracte
+    knopen. Geeft (pad, resterende abstracte knopen) terug.
+    """
+    if heuristic(start, goal) >= HPA_MIN_DISTANCE:
+        result = hierarchical_path(start, goal, other_robot_positions)
+        if result is not None:
+            return result
+    return dijkstra(GRID, start, goal, other_robot_positions), []
+
+def plan_reachable_path(start, goal, other_robot_positions):
+    """
+    Plan een pad naar goal langs andere robots, of geef None als goal met deze
+    robots niet bereikbaar is. Als het labelen van de robotmarkeringen meer
+    kost dan een zoektocht over de hele component van start (veel robots op
+    een klein grid), wordt direct gepland en telt alleen een pad dat goal bereikt.
+    """
+    labels, _ = static_components()
+    label = labels[start[1] * GRID_WIDTH + start[0]]
+    search_cells = connectivity_cache["sizes"][label] if label >= 0 else len(labels)
+    if len(other_robot_positions) * CONNECTIVITY_STAMP_COST < search_cells:
+        if not is_reachable(start, goal, other_robot_positions):
+            return None
+        return plan_path(start, goal, other_robot_positions)
+    
+    path, abstract = plan_path(start, goal, other_robot_positions)
+    if abstract or (path and path[-1] == goal):
+        return path, abstract
+    return None
+
 #  Pad cache om huidig pad op te slaan 
 path_cache = []
+# Nog niet verfijnde knopen van een hiërarchisch pad (na het einde van path_cache)
+path_abstract = []
 
 #  Beweeg naar doel met botsingsvermijding 
 def move_to_target():
     """
-    Gebruik Dijkstra padplanning om stap voor stap naar de doelpositie te bewegen.
-    Vermijdt andere robots als dynamische obstakels.
+    Gebruik Dijkstra padplanning (hiërarchisch op lange afstanden) om stap voor
+    stap naar de doelpositie te bewegen. Vermijdt andere robots als dynamische obstakels.
     """
-    global path_cache
+    global path_cache, path_abstract
     
     if emergency_stop:
         logger.info("NOODSTOP actief - geen beweging toegestaan")
@@ -645,7 +1375,7 @@ def move_to_target():
     # Verwijder oude robotposities (ouder dan 5 seconden)
     current_time = time.time()
     for robot_id in list(other_robots.keys()):
-        if current_time - other_robots[robot_id].get("timestamp", 0) > 5:
+        if current_time - other_robots[robot_id].get("timestamp", 0) > ROBOT_STALE_AFTER:
             logger.info(f"Verouderde positiegegevens voor {robot_id} verwijderd")
             del other_robots[robot_id]
     
@@ -654,17 +1384,30 @@ def move_to_target():
         logger.info(f"Doel bereikt: ({target_gx}, {target_gy})")
         return
     
+    # Voorspel toekomstige posities van andere robots
+    predicted_robots = predict_robot_positions(other_robots) if other_robots else {}
+    
+    # Hiërarchisch pad: volgende abstracte stukken verfijnen voordat path_cache opraakt
+    if path_abstract and path_abstract[-1] == (target_gx, target_gy) and len(path_cache) < HPA_REFILL_CELLS:
+        refined = refine_path(path_cache[-1] if path_cache else (current_gx, current_gy),
+                              path_abstract, HPA_REFINE_LEGS, predicted_robots)
+        if refined:
+            path_cache.extend(refined[0])
+            path_abstract = refined[1]
+            logger.debug("Pad verfijnd tot %d stappen, nog %d abstracte knopen", len(path_cache), len(path_abstract))
+        else:
+            logger.info("Volgend deel van het hiërarchische pad geblokkeerd")
+            path_cache, path_abstract = [], []
+    
     # Bepaal of we het pad opnieuw moeten berekenen
     recalculate = False
     
     # Als pad leeg is of doel is veranderd: herbereken
-    if not path_cache or (target_gx, target_gy) != path_cache[-1] if path_cache else True:
+    planned_goal = path_abstract[-1] if path_abstract else path_cache[-1] if path_cache else None
+    if not path_cache or (target_gx, target_gy) != planned_goal:
         recalculate = True
         logger.info("Pad leeg of doel veranderd, herberekening nodig")
     
-    # Voorspel toekomstige posities van andere robots
-    predicted_robots = predict_robot_positions(other_robots) if other_robots else {}
-    
     # Controleer of er een robot in ons pad is of wordt voorspeld
     if path_cache and not recalculate:
         for robot_id, pos_data in predicted_robots.items():
@@ -703,20 +1446,67 @@ def move_to_target():
     if recalculate:
         logger.info(f"Pad berekenen van ({current_gx},{current_gy}) naar ({target_gx},{target_gy})")
         
+        start, goal = (current_gx, current_gy), (target_gx, target_gy)
+        path_abstract = []
+        
+        # Controleer eerst via de verbindingsindex welk niveau het doel kan bereiken,
+        # zodat dijkstra nooit het hele grid doorzoekt voor een onbereikbaar doel
+        # Doel in een afgesloten deel: naar de dichtstbijzijnde bereikbare cel
+        if not is_reachable(start, goal):
+            path_cache = []
+            closest = closest_reachable_cell(start, goal)
+            if not closest:
+                logger.info(f"Doel ({target_gx}, {target_gy}) ligt in een afgesloten deel van het grid, "
+                            f"robot staat op de dichtstbijzijnde bereikbare cel")
+                return
+            logger.warning(f"Doel ({target_gx}, {target_gy}) ligt in een afgesloten deel van het grid, "
+                           f"pad naar dichtstbijzijnde bereikbare cel {closest}")
+            goal = closest
+        
+        # Aantal ticks dat we al wachten op robots die het doel afsluiten
+        if not hasattr(move_to_target, "blocked_ticks"):
+            move_to_target.blocked_ticks = 0
+        
         # Probeer eerst met voorspelde robotposities
+        planned = None
         if predicted_robots:
-            logger.info("Pad berekenen met voorspelde robotposities")
-            path_cache = dijkstra(GRID, (current_gx, current_gy), (target_gx, target_gy), predicted_robots)
+            planned = plan_reachable_path(start, goal, predicted_robots)
+            if planned:
+                logger.info("Pad berekend met voorspelde robotposities")
         
-        # Als dat mislukt, probeer alleen met huidige posities
-        if not path_cache and other_robots:
-            logger.warning("Geen pad gevonden met voorspellingen, proberen met alleen huidige posities")
-            path_cache = dijkstra(GRID, (current_gx, current_gy), (target_gx, target_gy), other_robots)
+        # Als dat niet kan, probeer alleen met huidige posities (als er voorspellingen bij kwamen)
+        if not planned and len(other_robots) < len(predicted_robots):
+            planned = plan_reachable_path(start, goal, other_robots)
+            if planned:
+                logger.warning("Geen pad mogelijk met voorspellingen, berekend met alleen huidige posities")
         
-        # Als laatste redmiddel, probeer zonder robotvermijding
-        if not path_cache:
-            logger.warning("Geen pad gevonden met robotvermijding, proberen zonder vermijding")
-            path_cache = dijkstra(GRID, (current_gx, current_gy), (target_gx, target_gy))
+        if planned:
+            path_cache, path_abstract = planned
+            move_to_target.blocked_ticks = 0
+        
+        # Doel afgesloten door rijdende robots: even wachten tot de doorgang vrij is
+        elif other_robots and robots_moving() and move_to_target.blocked_ticks < BLOCKED_WAIT_TICKS:
+            move_to_target.blocked_ticks += 1
+            logger.info("Doel afgesloten door andere robots, wachten tot de doorgang vrij is (%d/%d)",
+                        move_to_target.blocked_ticks, BLOCKED_WAIT_TICKS)
+            path_cache = []
+            return
+        
+        # Doel afgesloten door stilstaande robots (of te lang gewacht): pad naar de
+        # dichtstbijzijnde bereikbare cel, en anders zonder robotvermijding
+        elif other_robots:
+            path_cache = []
+            closest = closest_reachable_cell(start, goal, other_robots)
+            if closest:
+                logger.warning(f"Doel afgesloten door andere robots, pad naar dichtstbijzijnde bereikbare cel {closest}")
+                path_cache, path_abstract = plan_path(start, closest, other_robots)
+            if not path_cache:
+                logger.warning("Geen dichterbij gelegen cel bereikbaar, pad berekenen zonder robotvermijding")
+                path_cache, path_abstract = plan_path(start, goal)
+        
+        else:
+            path_cache, path_abstract = plan_path(start, goal)
+            move_to_target.blocked_ticks = 0
             
         if not path_cache:
             logger.error(f"Geen pad kon worden gevonden naar ({target_gx}, {target_gy})")
@@ -736,7 +1526,10 @@ def move_to_target():
                 logger.error("Robot zit volledig vast, geen geldige bewegingen mogelijk")
                 return
             
-        logger.info(f"Pad berekend met {len(path_cache)} stappen")
+        if path_abstract:
+            logger.info(f"Pad berekend met {len(path_cache)} stappen, nog {len(path_abstract)} abstracte knopen")
+        else:
+            logger.info(f"Pad berekend met {len(path_cache)} stappen")
     
     # Als we een pad hebben om te volgen
     if path_cache:
@@ -762,29 +1555,53 @@ def move_to_target():
             logger.error(f"Kan positie niet instellen op ({new_x}, {new_y})")
 
 #  Hoofdlus 
-logger.info("Simulatie gestart")
-last_movement_time = time.time()
+def main():
+    logger.info("Simulatie gestart")
+    last_movement_time = time.time()
+    tick_index = 0
 
-try:
-    while robot.step(timestep) != -1:
-        current_time = time.time()
-        
-        # Elke seconde bewegen en status versturen
-        if current_time - last_movement_time >= 1.0:
-            move_to_target()
-            send_status()
-            last_movement_time = current_time
+    try:
+        while robot.step(timestep) != -1:
+            current_time = time.time()
             
-        # Korte pauze voor CPU belasting
-        time.sleep(0.1)
-except KeyboardInterrupt:
-    logger.info("Simulatie handmatig gestopt")
-except Exception as e:
-    logger.critical("Onverwachte fout: %s", e)
-finally:
-    # Opruimen bij afsluiten
-    if mqtt_connected:
-        client.loop_stop()
-        client.disconnect()
-        logger.info("MQTT verbinding afgesloten")
-    logger.info("Simulatie beëindigd")
+            # Elke seconde bewegen en status versturen
+            if current_time - last_movement_time >= 1.0:
+                if fleet:
+                    read_fleet_state(current_time)
+                if recorder:
+                    record(recorder.tick, current_time, (sensor_N.getValue(), sensor_E.getValue(),
+                                                         sensor_S.getValue(), sensor_W.getValue()))
+                tick_start = time.perf_counter()
+                move_to_target()
+                send_status()
+                if fleet:
+                    publish_fleet_state(current_time)
+                if recorder:
+                    pos = trans.getSFVec3f()
+                    record(recorder.pose, current_time, tick_index, pos[0], pos[1],
+                           time.perf_counter() - tick_start, len(path_cache))
+                tick_index += 1
+                last_movement_time = current_time
+                
+            # Korte pauze voor CPU belasting
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        logger.info("Simulatie handmatig gestopt")
+    except Exception as e:
+        logger.critical("Onverwachte fout: %s", e)
+    finally:
+        # Opruimen bij afsluiten
+        if mqtt_connected:
+            client.loop_stop()
+            client.disconnect()
+            logger.info("MQTT verbinding afgesloten")
+        if fleet:
+            fleet.close()
+            logger.info("Gedeelde vlootstatus losgekoppeld")
+        if recorder:
+            recorder.close()
+            logger.info("Opname opgeslagen in %s", RECORD_PATH)
+        logger.info("Simulatie beëindigd")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Benchmarks voor de hot paths van de robotcontroller.
+
+Meet dijkstra, hierarchical_path, mark_robot_obstacles, predict_robot_positions,
+find_closest_valid_position, validate_coordinates, de JSON-codering in
+send_status/on_status, de gedeelde vlootstatus (fleet_state.py) en een
+volledige move_to_target-tick, over kaartgroottes
+van 10x10 tot 1000x1000 en 1 tot 500 andere robots. De controller draait
+offline (zie offline.py) met nepsensoren en nepposities.
+
+Gebruik:
+    python benchmark.py                      # vergelijk met opgeslagen baseline
+    python benchmark.py --quick              # alleen kaarten t/m 100x100
+    python benchmark.py --filter dijkstra    # alleen cases met 'dijkstra' in de naam
+    python benchmark.py --update-baseline    # sla huidige metingen op als baseline
+    python benchmark.py --passes 5           # elke case vijf keer (standaard drie), snelste telt
+
+De run faalt (exitcode 1) als een case meer dan `--threshold` keer trager is
+dan de baseline. Baselines zijn machineafhankelijk: genereer ze opnieuw op de
+machine waar de controle draait.
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+import fleet_state
+from offline import FakeMessage, load_controller, tiled_grid
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+MAP_SIZES = [10, 50, 100, 500, 1000]
+ROBOT_COUNTS = [1, 10, 50, 100, 500]
+QUICK_MAX_SIZE = 100
+DEFAULT_THRESHOLD = 1.5
+# Elke case meerdere keren (verspreid over de run) meten, snelste telt; één
+# doorgang is op een drukke machine ruisiger dan de drempel
+DEFAULT_PASSES = 3
+
+# Maximaal een robot per zoveel vrije cellen, anders staat de kaart vol
+FREE_CELLS_PER_ROBOT = 20
+# Meetbudget per case en doorgang: minstens MIN_RUNS metingen, door tot MIN_TIME
+# seconden, zodat ook cases van enkele milliseconden genoeg metingen krijgen
+MIN_RUNS = 10
+MAX_RUNS = 1000
+MIN_TIME = 1.0
+# Zeer trage cases (bijv. zoeken over 1000x1000) maar één keer meten
+SLOW_RUN = 1.0
+BATCH = 1000
+
+
+def measure(fn, setup=None, warmup=False):
+    """
+    Voer `fn` herhaald uit en geef de snelste uitvoertijd in seconden terug.
+    `setup` wordt voor elke meting aangeroepen en niet meegeteld. Met `warmup`
+    telt de eerste uitvoering niet mee (bijv. eenmalig opgebouwde kaarten).
+    De garbage collector staat uit tijdens het meten, net als bij timeit.
+    """
+    if warmup:
+        if setup:
+            setup()
+        fn()
+    best = float("inf")
+    total = 0.0
+    runs = 0
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while runs < MAX_RUNS:
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            best = min(best, elapsed)
+            total += elapsed
+            runs += 1
+            if elapsed >= SLOW_RUN or (runs >= MIN_RUNS and total >= MIN_TIME):
+                break
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best
+
+
+class Results(dict):
+    # Verzamelt metingen per casenaam; cases buiten het filter worden overgeslagen
+    def __init__(self, name_filter=None):
+        super().__init__()
+        self.name_filter = name_filter
+
+    def measure(self, name, fn, setup=None, per_call=1, warmup=False):
+        if self.name_filter and self.name_filter not in name:
+            return
+        seconds = measure(fn, setup, warmup) / per_call
+        self[name] = min(seconds, self.get(name, seconds))
+
+
+def free_cells(grid):
+    return [(x, y) for y, row in enumerate(grid) for x, cell in enumerate(row) if cell == 1]
+
+
+def place_robots(ctrl, count, rng, keep_clear=()):
+    """
+    Plaats `count` robots op willekeurige vrije cellen, niet binnen de
+    veiligheidsmarge van de cellen in `keep_clear` (start en doel).
+    """
+    margin = ctrl.ROBOT_SAFETY_MARGIN + 1
+    candidates = [cell for cell in free_cells(ctrl.GRID)
+                  if all(abs(cell[0] - c[0]) + abs(cell[1] - c[1]) > margin for c in keep_clear)]
+    robots = {}
+    for index, (gx, gy) in enumerate(rng.sample(candidates, count)):
+        x, y = ctrl.grid_to_world(gx, gy)
+        robots[f"bench{index}"] = {"x": x, "y": y, "timestamp": ctrl.time.time()}
+    return robots
+
+
+def case_rng(*key):
+    # Vaste seed per case, zodat plaatsingen niet afhangen van welke cases draaien
+    return random.Random("-".join(map(str, key)))
+
+
+def robot_counts_for(grid, robot_counts):
+    limit = len(free_cells(grid)) // FREE_CELLS_PER_ROBOT
+    return [count for count in robot_counts if count <= max(limit, 1)]
+
+
+def status_payload(sender, x, y):
+    return json.dumps({
+        "protocolVersion": 1.0,
+        "data": {
+            "sender": sender,
+            "target": "server",
+            "msg": {"location": {"x": x, "y": y}, "obstacles": [], "emergency": False}
+        }
+    }).encode()
+
+
+#  Benchmarkcases
+def bench_map(results, ctrl, base_grid, size, robot_counts):
+    # Cases die afhangen van kaartgrootte (en aantal robots)
+    ctrl.set_grid(tiled_grid(base_grid, size))
+    start, goal = (0, 0), (size - 1, size - 1)
+
+    for count in robot_counts_for(ctrl.GRID, robot_counts):
+        robots = place_robots(ctrl, count, case_rng(size, count), keep_clear=(start, goal))
+        key = f"size={size},robots={count}"
+
+        results.measure(f"mark_robot_obstacles[{key}]",
+                        lambda: ctrl.mark_robot_obstacles(ctrl.GRID, robots))
+        results.measure(f"dijkstra[{key}]",
+                        lambda: ctrl.dijkstra(ctrl.GRID, start, goal, robots))
+
+        # Volledige tick: eigen robot op de start, doel in de tegenoverliggende hoek
+        start_world = ctrl.grid_to_world(*start)
+        goal_world = ctrl.grid_to_world(*goal)
+
+        def reset_tick():
+            ctrl.trans.setSFVec3f([start_world[0], start_world[1], 0.0])
+            ctrl.TARGET_POS = [goal_world[0], goal_world[1]]
+            ctrl.path_cache = []
+            ctrl.path_abstract = []
+            ctrl.other_robots = {robot_id: dict(data, timestamp=ctrl.time.time())
+                                 for robot_id, data in robots.items()}
+            ctrl.predict_robot_positions.history = {}
+            # Robots bewegen elke tick: geen gecachete markeringen hergebruiken
+            ctrl.connectivity_cache["stamped"].clear()
+            ctrl.hpa_cache["stamped"].clear()
+
+        # Warm: de eerste tick op een nieuw grid bouwt nearest_free_map, de
+        # componentlabels en clustergrafen op (zie de aparte cases daarvoor)
+        results.measure(f"move_to_target[{key}]", ctrl.move_to_target, reset_tick, warmup=True)
+
+        # Bereikbaarheid met nieuwe robotmarkeringen (labeling van geraakte componenten)
+        def clear_stamps():
+            ctrl.static_components()
+            ctrl.connectivity_cache["stamped"].clear()
+
+        results.measure(f"is_reachable[{key}]", lambda: ctrl.is_reachable(start, goal, robots), clear_stamps)
+
+        # Hiërarchisch plannen over de (warme) statische clustergrafen; alleen de
+        # clusters met robotmarkeringen worden per keer opnieuw opgebouwd
+        if ctrl.heuristic(start, goal) >= ctrl.HPA_MIN_DISTANCE:
+            def clear_cluster_stamps():
+                ctrl.hpa_cache["stamped"].clear()
+
+            results.measure(f"hierarchical_path[{key}]", lambda: ctrl.hierarchical_path(start, goal, robots),
+                            clear_cluster_stamps, warmup=True)
+
+    # Slechtste geval: doel volledig afgesloten door robots rond het doel
+    blockers = {f"blocker{i}": dict(zip("xy", ctrl.grid_to_world(goal[0] - dx, goal[1] - (3 - dx))))
+                for i, dx in enumerate(range(4))}
+    start_world = ctrl.grid_to_world(*start)
+    goal_world = ctrl.grid_to_world(*goal)
+
+    def reset_blocked_tick():
+        ctrl.trans.setSFVec3f([start_world[0], start_world[1], 0.0])
+        ctrl.TARGET_POS = [goal_world[0], goal_world[1]]
+        ctrl.path_cache = []
+        ctrl.path_abstract = []
+        ctrl.other_robots = {robot_id: dict(data, timestamp=ctrl.time.time()) for robot_id, data in blockers.items()}
+        ctrl.predict_robot_positions.history = {}
+        ctrl.connectivity_cache["stamped"].clear()
+
+    results.measure(f"move_to_target_blocked[size={size}]", ctrl.move_to_target, reset_blocked_tick, warmup=True)
+
+    # Eerste hiërarchische planning op een nieuw grid: bouwt de benodigde clustergrafen op
+    if ctrl.heuristic(start, goal) >= ctrl.HPA_MIN_DISTANCE:
+        def invalidate_clusters():
+            ctrl.hpa_cache["version"] = None
+
+        results.measure(f"hierarchical_path_cold[size={size}]", lambda: ctrl.hierarchical_path(start, goal),
+                        invalidate_clusters)
+
+    # Eenmalige opbouw van de kaart met dichtstbijzijnde vrije cellen (per gridversie)
+    def invalidate_grid():
+        ctrl.GRID_VERSION += 1
+
+    results.measure(f"nearest_free_map[size={size}]", ctrl.nearest_free_map, invalidate_grid)
+
+    # Zoek dichtstbijzijnde vrije cel vanuit muurcellen
+    rng = case_rng(size)
+    walls = [(x, y) for y, row in enumerate(ctrl.GRID) for x, cell in enumerate(row) if cell == 0]
+    queries = [rng.choice(walls) for _ in range(BATCH)]
+    results.measure(f"find_closest_valid_position[size={size}]",
+                    lambda: [ctrl.find_closest_valid_position(ctrl.GRID, q) for q in queries],
+                    per_call=BATCH, warmup=True)
+
+    coords = [(rng.uniform(-ctrl.MAX_BOUND, 2 * ctrl.MAX_BOUND), rng.uniform(-ctrl.MAX_BOUND, 2 * ctrl.MAX_BOUND))
+              for _ in range(BATCH)]
+    results.measure(f"validate_coordinates[size={size}]",
+                    lambda: [ctrl.validate_coordinates(x, y) for x, y in coords], per_call=BATCH, warmup=True)
+
+
+@contextlib.contextmanager
+def bench_fleet(ctrl, robots):
+    # Tijdelijk vlootsegment met een slot per robot; elke robot publiceert zelf, zoals een echte controller
+    name = f"cs_bench_{os.getpid()}"
+    fleet = fleet_state.FleetState(name, ctrl.ROBOT_ID, slots=len(robots) + 1)
+    others = []
+    try:
+        for robot_id, data in robots.items():
+            other = fleet_state.FleetState(name, robot_id)
+            others.append(other)
+            other.publish(data["x"], data["y"], None, 0, data["timestamp"])
+        yield fleet
+    finally:
+        for other in others:
+            other.close()
+        fleet.close(unlink=True)
+
+
+def bench_robots(results, ctrl, base_grid, robot_counts):
+    # Cases die alleen afhangen van het aantal robots
+    ctrl.set_grid(tiled_grid(base_grid, max(MAP_SIZES)))
+
+    for count in robot_counts:
+        robots = place_robots(ctrl, count, case_rng(count))
+        moved = {robot_id: dict(data, x=data["x"] + ctrl.STEP_SIZE) for robot_id, data in robots.items()}
+
+        def predict_twice():
+            ctrl.predict_robot_positions.history = {}
+            ctrl.predict_robot_positions(robots)
+            ctrl.predict_robot_positions(moved)
+
+        results.measure(f"predict_robot_positions[robots={count}]", predict_twice)
+
+        messages = [FakeMessage(ctrl.TOPIC_STATUS, status_payload(robot_id, data["x"], data["y"]))
+                    for robot_id, data in robots.items()]
+        results.measure(f"on_status[robots={count}]",
+                        lambda: [ctrl.on_status(ctrl.client, None, message) for message in messages],
+                        per_call=count)
+
+        # Zelfde buren via gedeeld geheugen: lezen en overnemen in other_robots, per robot
+        with bench_fleet(ctrl, robots) as fleet:
+            ctrl.fleet = fleet
+            results.measure(f"fleet_read[robots={count}]", lambda: ctrl.read_fleet_state(0.0), per_call=count)
+            ctrl.fleet = None
+        ctrl.other_robots.clear()
+        ctrl.fleet_robots = set()
+
+    def send_once():
+        ctrl.last_sent_position = None
+        ctrl.send_status()
+
+    results.measure("send_status", lambda: [send_once() for _ in range(BATCH)], per_call=BATCH)
+    ctrl.client.published.clear()
+
+    with bench_fleet(ctrl, {}) as fleet:
+        ctrl.fleet = fleet
+        results.measure("fleet_publish", lambda: [ctrl.publish_fleet_state(0.0) for _ in range(BATCH)],
+                        per_call=BATCH)
+        ctrl.fleet = None
+
+
+def run(sizes, robot_counts, name_filter=None, passes=DEFAULT_PASSES):
+    # Voer alle cases `passes` keer uit en bewaar per case de snelste meting
+    ctrl, _ = load_controller(seed=0, log_level=logging.CRITICAL)
+    base_grid = ctrl.GRID
+
+    results = Results(name_filter)
+    for _ in range(passes):
+        for size in sizes:
+            bench_map(results, ctrl, base_grid, size, robot_counts)
+        bench_robots(results, ctrl, base_grid, robot_counts)
+    return results
+
+
+#  Baseline vergelijking
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("cases", {})
+
+
+def save_baseline(path, results):
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, "w") as f:
+        json.dump({"python": sys.version.split()[0], "cases": dict(sorted(baseline.items()))}, f, indent=2)
+        f.write("\n")
+
+
+def compare(results, baseline, threshold):
+    # Geeft de lijst met cases die meer dan `threshold` keer trager zijn dan de baseline
+    regressions = []
+    for name, seconds in results.items():
+        reference = baseline.get(name)
+        ratio = seconds / reference if reference else None
+        status = "nieuw" if ratio is None else f"x{ratio:.2f}"
+        if ratio is not None and ratio > threshold:
+            status += "  REGRESSIE"
+            regressions.append(name)
+        print(f"{name:<60} {seconds * 1e6:>14.1f} us  {status}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de hot paths van de robotcontroller")
+    parser.add_argument("--quick", action="store_true", help=f"Alleen kaarten t/m {QUICK_MAX_SIZE}x{QUICK_MAX_SIZE}")
+    parser.add_argument("--filter", help="Alleen cases waarvan de naam deze tekst bevat")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Pad naar het baselinebestand")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Maximale vertraging ten opzichte van de baseline (standaard: %(default)s)")
+    parser.add_argument("--passes", type=int, default=DEFAULT_PASSES,
+                        help="Aantal keer dat alle cases draaien; de snelste meting telt (minder ruis)")
+    parser.add_argument("--update-baseline", action="store_true", help="Sla de metingen op als nieuwe baseline")
+    args = parser.parse_args(argv)
+
+    sizes = [size for size in MAP_SIZES if not args.quick or size <= QUICK_MAX_SIZE]
+    robot_counts = [count for count in ROBOT_COUNTS if not args.quick or count <= 50]
+    results = run(sizes, robot_counts, args.filter, args.passes)
+
+    regressions = compare(results, load_baseline(args.baseline), args.threshold)
+
+    if args.update_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline bijgewerkt: {args.baseline}")
+        return 0
+    if regressions:
+        print(f"{len(regressions)} regressie(s) boven drempel x{args.threshold}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
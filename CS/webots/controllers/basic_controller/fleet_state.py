@@ -0,0 +1,213 @@
+"""
+Gedeelde vlootstatus voor robotcontrollers op dezelfde machine.
+
+Controllers die op dezelfde host draaien delen hun positie, volgende cel en
+vlaggen via een `multiprocessing.shared_memory`-segment in plaats van via een
+rondreis langs de MQTT-broker. MQTT blijft het pad naar de server en naar
+robots op andere machines.
+
+Indeling van het segment:
+
+    header:  magic (8s) | versie (H) | aantal slots (H) | slots in gebruik (I)
+    slot:    seq (I) | robot-id (16s) | x (d) | y (d) | volgende gx (i) | volgende gy (i)
+             | vlaggen (I) | tijdstempel (d)
+
+Elk slot heeft precies één schrijver (de robot die het slot geclaimd heeft) en
+wordt beschermd door een seqlock: de schrijver maakt `seq` oneven, schrijft de
+velden en maakt `seq` weer even. Lezers kopiëren het slot en proberen opnieuw
+als `seq` oneven was of tijdens het lezen veranderde. Er zijn geen locks nodig
+tussen processen. Lezers bekijken alleen de eerste "slots in gebruik" slots.
+"""
+
+import struct
+import sys
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+MAGIC = b"CSFLEET\x01"
+FORMAT_VERSION = 1
+DEFAULT_SLOTS = 64
+
+HEADER = struct.Struct("<8sHHI")
+IN_USE = struct.Struct("<I")
+IN_USE_OFFSET = HEADER.size - IN_USE.size
+SEQ = struct.Struct("<I")
+# robot-id, x, y, volgende gx, volgende gy, vlaggen, tijdstempel
+ENTRY = struct.Struct("<16sddiiId")
+SLOT_SIZE = SEQ.size + ENTRY.size
+
+#  Vlaggen
+FLAG_EMERGENCY = 1
+
+# Geen volgende cel (robot staat stil)
+NO_CELL = -1
+
+# Aantal pogingen voordat een lezer een slot overslaat dat steeds beschreven wordt
+READ_RETRIES = 100
+
+# Wachttijd (seconden) tot de aanmaker van het segment de header heeft geschreven
+ATTACH_TIMEOUT = 1.0
+
+# Slot van een robot die langer dan dit (seconden) niet schreef mag worden overgenomen
+CLAIM_STALE_AFTER = 10.0
+
+FleetEntry = namedtuple("FleetEntry", "robot_id x y next_gx next_gy flags timestamp")
+
+
+def segment_size(slots):
+    return HEADER.size + slots * SLOT_SIZE
+
+
+def _tracked_by_resource_tracker():
+    # Voor Python 3.13 registreert elk proces dat een segment opent het bij de resource tracker
+    return sys.version_info < (3, 13) and sys.platform != "win32"
+
+
+def _open_segment(name, size):
+    # Open een bestaand segment of maak het aan; geeft (segment, aangemaakt) terug
+    kwargs = {"track": False} if sys.version_info >= (3, 13) else {}
+    try:
+        segment, created = shared_memory.SharedMemory(name=name, create=True, size=size, **kwargs), True
+    except FileExistsError:
+        segment, created = shared_memory.SharedMemory(name=name, **kwargs), False
+
+    if _tracked_by_resource_tracker():
+        # Voor Python 3.13 verwijdert de resource tracker het segment zodra dit
+        # proces stopt, ook als andere controllers het nog gebruiken
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(segment._name, "shared_memory")
+    return segment, created
+
+
+class FleetState:
+    """
+    Tabel met de status van alle lokale robots in gedeeld geheugen. De eerste
+    controller maakt het segment aan, volgende controllers koppelen eraan.
+    """
+
+    def __init__(self, name, robot_id, slots=DEFAULT_SLOTS):
+        self.name = name
+        self.robot_id = robot_id
+        self._robot_id_bytes = robot_id.encode()[:16].ljust(16, b"\x00")
+        self._slot = None
+        self._segment, created = _open_segment(name, segment_size(slots))
+        self._buf = self._segment.buf
+
+        if created:
+            HEADER.pack_into(self._buf, 0, MAGIC, FORMAT_VERSION, slots, 0)
+        deadline = time.monotonic() + ATTACH_TIMEOUT
+        magic, version, self.slots, _ = HEADER.unpack_from(self._buf, 0)
+        while magic == bytes(len(MAGIC)) and time.monotonic() < deadline:
+            # Segment net aangemaakt door een andere controller
+            time.sleep(0.01)
+            magic, version, self.slots, _ = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Geen geldig vlootsegment: {name}")
+        if self._segment.size < segment_size(self.slots):
+            self.close()
+            raise ValueError(f"Vlootsegment {name} is kleiner dan {self.slots} slots")
+
+    def _offset(self, index):
+        return HEADER.size + index * SLOT_SIZE
+
+    def _read_slot(self, index):
+        # Seqlock-lezing van één slot; None als het slot blijft veranderen
+        offset = self._offset(index)
+        buf = self._buf
+        for _ in range(READ_RETRIES):
+            (seq_before,) = SEQ.unpack_from(buf, offset)
+            if seq_before & 1:
+                continue
+            fields = ENTRY.unpack_from(buf, offset + SEQ.size)
+            (seq_after,) = SEQ.unpack_from(buf, offset)
+            if seq_before == seq_after:
+                return fields
+        return None
+
+    def _write_slot(self, index, robot_id_bytes, x, y, next_gx, next_gy, flags, timestamp):
+        offset = self._offset(index)
+        (seq,) = SEQ.unpack_from(self._buf, offset)
+        seq |= 1
+        SEQ.pack_into(self._buf, offset, seq)
+        ENTRY.pack_into(self._buf, offset + SEQ.size, robot_id_bytes, x, y, next_gx, next_gy, flags, timestamp)
+        SEQ.pack_into(self._buf, offset, (seq + 1) & 0xFFFFFFFF)
+
+    def _claim(self, timestamp):
+        # Zoek het eigen slot, anders een leeg of verlaten slot
+        free = None
+        for index in range(self.slots):
+            fields = self._read_slot(index)
+            if fields is None:
+                continue
+            if fields[0] == self._robot_id_bytes:
+                return index
+            if free is None and (not fields[0].strip(b"\x00") or timestamp - fields[6] > CLAIM_STALE_AFTER):
+                free = index
+        if free is None:
+            raise RuntimeError(f"Geen vrij slot in vlootsegment {self.name} ({self.slots} slots)")
+        return free
+
+    def publish(self, x, y, next_cell, flags, timestamp):
+        """
+        Schrijf de eigen positie, volgende cel (of None) en vlaggen naar het
+        eigen slot. Claimt bij de eerste aanroep een slot, en opnieuw als een
+        tegelijk gestarte controller hetzelfde vrije slot nam.
+        """
+        if self._slot is not None:
+            fields = self._read_slot(self._slot)
+            if fields is not None and fields[0] != self._robot_id_bytes:
+                self._slot = None
+        if self._slot is None:
+            self._slot = self._claim(timestamp)
+        (in_use,) = IN_USE.unpack_from(self._buf, IN_USE_OFFSET)
+        if self._slot >= in_use:
+            # Niet atomair; een gelijktijdige claim kan dit overschrijven, de
+            # volgende publish herstelt het
+            IN_USE.pack_into(self._buf, IN_USE_OFFSET, self._slot + 1)
+        next_gx, next_gy = next_cell if next_cell else (NO_CELL, NO_CELL)
+        self._write_slot(self._slot, self._robot_id_bytes, x, y, next_gx, next_gy, flags, timestamp)
+
+    def read(self, now=None, max_age=None):
+        """
+        Geef de status van alle andere robots in het segment als lijst van
+        FleetEntry. Slots die tijdens het lezen steeds beschreven worden,
+        worden deze keer overgeslagen. Met `now` en `max_age` worden ook slots
+        overgeslagen die langer dan `max_age` seconden niet beschreven zijn
+        (bijv. van een gecrashte controller; het slot blijft tot iemand het claimt).
+        """
+        own_id = self._robot_id_bytes.rstrip(b"\x00")
+        (in_use,) = IN_USE.unpack_from(self._buf, IN_USE_OFFSET)
+        entries = []
+        for index in range(min(in_use, self.slots)):
+            if index == self._slot:
+                continue
+            fields = self._read_slot(index)
+            if fields is None:
+                continue
+            robot_id = fields[0].rstrip(b"\x00")
+            if not robot_id or robot_id == own_id:
+                continue
+            if max_age is not None and now - fields[6] > max_age:
+                continue
+            entries.append(FleetEntry(robot_id.decode(), *fields[1:]))
+        return entries
+
+    def release(self):
+        # Maak het eigen slot vrij zodat andere robots ons niet meer zien
+        fields = self._read_slot(self._slot) if self._slot is not None else None
+        if fields is not None and fields[0] == self._robot_id_bytes:
+            self._write_slot(self._slot, b"\x00" * 16, 0.0, 0.0, NO_CELL, NO_CELL, 0, 0.0)
+        self._slot = None
+
+    def close(self, unlink=False):
+        self.release()
+        self._buf = None
+        self._segment.close()
+        if unlink:
+            if _tracked_by_resource_tracker():
+                # unlink() meldt het segment af bij de tracker; eerst weer aanmelden
+                from multiprocessing import resource_tracker
+                resource_tracker.register(self._segment._name, "shared_memory")
+            self._segment.unlink()
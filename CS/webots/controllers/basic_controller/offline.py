@@ -0,0 +1,208 @@
+"""
+Offline omgeving voor de robotcontroller.
+
+Laadt basic_controller.py zonder Webots en zonder MQTT-broker door de
+`controller`- en `paho.mqtt.client`-modules te vervangen door eenvoudige
+nepobjecten. Gebruikt door replay.py om opgenomen verkeer opnieuw af te spelen
+en door benchmark.py om de hot paths te meten.
+"""
+
+import importlib.util
+import logging
+import os
+import sys
+import time
+import types
+
+CONTROLLER_DIR = os.path.dirname(os.path.abspath(__file__))
+CONTROLLER_PATH = os.path.join(CONTROLLER_DIR, "basic_controller.py")
+
+# Omgevingsvariabelen die een offline controller niet mag overnemen: geen
+# opname naar bestand en geen koppeling met de vloot van echte controllers
+ISOLATED_ENV = ("ROBOT_RECORD_PATH", "ROBOT_FLEET_SHM")
+
+# Sensorwaarde zonder obstakel (boven OBSTACLE_THRESHOLD)
+FREE_SENSOR_VALUE = 1000.0
+
+
+class FakeField:
+    # Nep Webots-veld voor translation en rotation
+    def __init__(self, value):
+        self.value = list(value)
+
+    def getSFVec3f(self):
+        return list(self.value)
+
+    def setSFVec3f(self, value):
+        self.value = list(value)
+
+    def setSFRotation(self, value):
+        self.value = list(value)
+
+
+class FakeNode:
+    def __init__(self):
+        self.fields = {
+            "translation": FakeField([0.0, 0.0, 0.0]),
+            "rotation": FakeField([0, 0, 1, 0]),
+        }
+
+    def getField(self, name):
+        return self.fields[name]
+
+
+class FakeDevice:
+    # Nep afstandssensor of LED
+    def __init__(self, name):
+        self.name = name
+        self.value = FREE_SENSOR_VALUE
+
+    def enable(self, timestep):
+        pass
+
+    def getValue(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class FakeSupervisor:
+    def __init__(self):
+        self.node = FakeNode()
+        self.devices = {}
+
+    def getSelf(self):
+        return self.node
+
+    def getBasicTimeStep(self):
+        return 32
+
+    def getDevice(self, name):
+        return self.devices.setdefault(name, FakeDevice(name))
+
+    def step(self, timestep):
+        return -1
+
+
+class FakeMqttClient:
+    # Nep MQTT-client die verzonden berichten bewaart in plaats van te publiceren
+    def __init__(self, client_id=None, protocol=None):
+        self.client_id = client_id
+        self.published = []
+
+    def connect(self, host, port):
+        pass
+
+    def subscribe(self, topic):
+        pass
+
+    def message_callback_add(self, topic, callback):
+        pass
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload):
+        self.published.append((topic, payload))
+
+
+class FakeMessage:
+    # Nep MQTT-bericht zoals doorgegeven aan on_command en on_status
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class FakeClock:
+    """
+    Vervangt de `time`-module van de controller zodat tijdstempels
+    (hartslag, verouderde robotposities) deterministisch zijn.
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def perf_counter(self):
+        return time.perf_counter()
+
+
+def _fake_modules():
+    controller_module = types.ModuleType("controller")
+    controller_module.Supervisor = FakeSupervisor
+
+    client_module = types.ModuleType("paho.mqtt.client")
+    client_module.Client = FakeMqttClient
+    client_module.MQTTv311 = 4
+
+    mqtt_module = types.ModuleType("paho.mqtt")
+    mqtt_module.client = client_module
+    paho_module = types.ModuleType("paho")
+    paho_module.mqtt = mqtt_module
+
+    return {
+        "controller": controller_module,
+        "paho": paho_module,
+        "paho.mqtt": mqtt_module,
+        "paho.mqtt.client": client_module,
+    }
+
+
+def load_controller(seed=None, start_time=0.0, log_level=logging.WARNING, path=CONTROLLER_PATH):
+    """
+    Laad een nieuwe, onafhankelijke instantie van de controller met nep Webots,
+    nep MQTT en een nepklok. Met `path` kan een andere versie van de controller
+    (bijv. een nieuwe planner) geladen worden. Geeft (module, klok) terug.
+    """
+    # Voorkom dat de controller een logbestand aanmaakt en elke stap logt
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger("RobotController").setLevel(log_level)
+
+    fakes = _fake_modules()
+    saved_modules = {name: sys.modules.get(name) for name in fakes}
+    saved_seed = os.environ.get("ROBOT_SEED")
+    saved_env = {name: os.environ.pop(name) for name in ISOLATED_ENV if name in os.environ}
+    controller_dir = os.path.dirname(os.path.abspath(path))
+    if controller_dir not in sys.path:
+        sys.path.insert(0, controller_dir)
+
+    try:
+        sys.modules.update(fakes)
+        if seed is not None:
+            os.environ["ROBOT_SEED"] = str(seed)
+        spec = importlib.util.spec_from_file_location("basic_controller", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        for name, saved in saved_modules.items():
+            if saved is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = saved
+        if saved_seed is None:
+            os.environ.pop("ROBOT_SEED", None)
+        else:
+            os.environ["ROBOT_SEED"] = saved_seed
+        os.environ.update(saved_env)
+
+    clock = FakeClock(start_time)
+    module.time = clock
+    return module, clock
+
+
+def tiled_grid(base, size):
+    # Bouw een vierkant grid van `size` x `size` door het arenapatroon te herhalen
+    return [[base[y % len(base)][x % len(base[0])] for x in range(size)] for y in range(size)]
+
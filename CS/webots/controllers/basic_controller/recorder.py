@@ -0,0 +1,161 @@
+"""
+Compacte opname van MQTT-verkeer en robotposities voor Connected Systems.
+
+Het logbestand is een binair append-only formaat dat zonder kopieën via
+mmap gelezen kan worden:
+
+    header:  magic (8s) | versie (H) | gereserveerd (H) | seed (Q) | starttijd (d) | robot-id (16s)
+    record:  soort (B) | tijd sinds start (d) | lengte (I) | payload (lengte bytes)
+
+Berichtrecords (RECV_COMMAND, RECV_STATUS, SENT) bevatten een topic met
+lengteprefix (H) gevolgd door de ruwe MQTT-payload. Tickrecords markeren het
+begin van een tick en bevatten de sensorwaarden N, E, S, W (4d) van die tick,
+poserecords het resultaat ervan. Vlootrecords bevatten de
+uit gedeeld geheugen gelezen status van lokale robots (zie fleet_state.py) als
+reeks vaste entries.
+"""
+
+import mmap
+import struct
+import threading
+
+MAGIC = b"CSREC\x00\x00\x01"
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<8sHHQd16s")
+RECORD = struct.Struct("<BdI")
+TOPIC_LEN = struct.Struct("<H")
+# tick-index, x, y, ticktijd in seconden, resterende padlengte
+POSE = struct.Struct("<IdddI")
+# afstandssensoren N, E, S, W
+SENSORS = struct.Struct("<dddd")
+# robot-id, x, y, volgende gx, volgende gy, vlaggen, tijdstempel (zelfde indeling als fleet_state.ENTRY)
+FLEET_ENTRY = struct.Struct("<16sddiiId")
+
+#  Recordsoorten
+RECV_COMMAND = 1
+RECV_STATUS = 2
+SENT = 3
+TICK = 4
+POSE_RECORD = 5
+FLEET_STATE = 6
+
+
+class FlightRecorder:
+    """
+    Schrijft ontvangen en verzonden berichten en de pose per tick naar een
+    binair logbestand. Veilig aan te roepen vanuit de MQTT-thread en de hoofdlus.
+    """
+
+    def __init__(self, path, seed, robot_id, start_time):
+        self.path = path
+        self.start_time = start_time
+        self._lock = threading.Lock()
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, seed, start_time,
+                                     robot_id.encode()[:16]))
+
+    def _append(self, kind, timestamp, payload):
+        record = RECORD.pack(kind, timestamp - self.start_time, len(payload))
+        with self._lock:
+            self._file.write(record)
+            self._file.write(payload)
+
+    def message(self, kind, timestamp, topic, payload):
+        # Sla een MQTT-bericht op met topic en ruwe payload
+        topic_bytes = topic.encode()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self._append(kind, timestamp, TOPIC_LEN.pack(len(topic_bytes)) + topic_bytes + payload)
+
+    def tick(self, timestamp, sensors):
+        # Markeer het begin van een tick met de sensorwaarden (N, E, S, W)
+        self._append(TICK, timestamp, SENSORS.pack(*sensors))
+
+    def pose(self, timestamp, tick_index, x, y, tick_seconds, path_length):
+        # Sla het resultaat van een tick op en schrijf de buffer weg
+        self._append(POSE_RECORD, timestamp, POSE.pack(tick_index, x, y, tick_seconds, path_length))
+        with self._lock:
+            self._file.flush()
+
+    def fleet(self, timestamp, entries):
+        # Sla de gelezen status van lokale robots op
+        payload = b"".join(FLEET_ENTRY.pack(robot_id.encode()[:16], *fields)
+                           for robot_id, *fields in entries)
+        self._append(FLEET_STATE, timestamp, payload)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class RecordLog:
+    """
+    Leest een opgenomen log via mmap. Records worden als memoryview-slices
+    teruggegeven zodat payloads niet gekopieerd worden.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, version, _, self.seed, self.start_time, robot_id = HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Geen geldig opnamebestand: {path}")
+        self.robot_id = robot_id.rstrip(b"\x00").decode()
+
+    def __iter__(self):
+        # Geeft (soort, tijd sinds start, payload) per record
+        offset = HEADER.size
+        end = len(self._view)
+        while offset + RECORD.size <= end:
+            kind, elapsed, length = RECORD.unpack_from(self._view, offset)
+            offset += RECORD.size
+            if offset + length > end:
+                break  # Afgebroken laatste record (bijv. na crash)
+            yield kind, elapsed, self._view[offset:offset + length]
+            offset += length
+
+    def close(self):
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Er bestaan nog payload-slices (bijv. in de traceback van een fout
+            # tijdens het afspelen); de map sluit zodra die opgeruimd zijn
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def decode_message(payload):
+    # Splits een berichtrecord in (topic, payload-bytes)
+    (topic_len,) = TOPIC_LEN.unpack_from(payload, 0)
+    start = TOPIC_LEN.size
+    topic = bytes(payload[start:start + topic_len]).decode()
+    return topic, payload[start + topic_len:]
+
+
+def decode_pose(payload):
+    # Geeft (tick-index, x, y, ticktijd, padlengte)
+    return POSE.unpack_from(payload, 0)
+
+
+def decode_sensors(payload):
+    # Geeft (N, E, S, W), of None voor tickrecords zonder sensorwaarden
+    if len(payload) < SENSORS.size:
+        return None
+    return SENSORS.unpack_from(payload, 0)
+
+
+def decode_fleet(payload):
+    # Geeft een lijst van (robot-id, x, y, volgende gx, volgende gy, vlaggen, tijdstempel)
+    return [(robot_id.rstrip(b"\x00").decode(), *fields)
+            for robot_id, *fields in FLEET_ENTRY.iter_unpack(payload)]
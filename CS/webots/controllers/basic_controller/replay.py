@@ -0,0 +1,132 @@
+"""
+Speel een opname (zie recorder.py) deterministisch opnieuw af tegen de
+controllerlogica, zonder Webots en zonder MQTT-broker.
+
+Gebruik:
+    python replay.py bot1.rec
+    python replay.py bot1.rec --controller ../nieuwe_planner/basic_controller.py
+
+De controller wordt geladen met de seed uit de opname, zodat de willekeurige
+startdoelpositie identiek is. Ontvangen berichten worden in opgenomen volgorde
+en op het opgenomen tijdstip aangeboden, net als de uit gedeeld geheugen gelezen
+vlootstatus; elke tick zet de opgenomen sensorwaarden en voert move_to_target
+en send_status uit. Het rapport
+vergelijkt posities, padlengtes en ticktijden.
+"""
+
+import argparse
+import sys
+import time
+
+from offline import CONTROLLER_PATH, FakeMessage, load_controller
+from recorder import (RecordLog, RECV_COMMAND, RECV_STATUS, SENT, TICK, POSE_RECORD, FLEET_STATE,
+                      decode_fleet, decode_message, decode_pose, decode_sensors)
+
+
+def path_length(poses, step_size):
+    # Totale afgelegde afstand in gridstappen (Manhattan) tussen opeenvolgende posities
+    total = 0
+    for (x0, y0), (x1, y1) in zip(poses, poses[1:]):
+        total += round(abs(x1 - x0) / step_size) + round(abs(y1 - y0) / step_size)
+    return total
+
+
+def replay(path, controller_path=CONTROLLER_PATH):
+    """
+    Speel een opname af en geef een rapport (dict) terug met de opgenomen en
+    herhaalde posities, ticktijden en verzonden berichten.
+    """
+    with RecordLog(path) as log:
+        ctrl, clock = load_controller(seed=log.seed, start_time=log.start_time, path=controller_path)
+        report = _run(log, ctrl, clock)
+        report["seed"] = log.seed
+        report["robot_id"] = log.robot_id
+
+    # Eerste tick waarop de herhaling afwijkt van de opname
+    report["first_divergence"] = None
+    for index, (recorded, replayed) in enumerate(zip(report["recorded_poses"], report["replayed_poses"])):
+        if abs(recorded[0] - replayed[0]) > 1e-6 or abs(recorded[1] - replayed[1]) > 1e-6:
+            report["first_divergence"] = index
+            break
+    return report
+
+
+def _run(log, ctrl, clock):
+    # Verwerk alle records; payload-views blijven niet buiten deze functie bestaan
+    handlers = {RECV_COMMAND: ctrl.on_command, RECV_STATUS: ctrl.on_status}
+
+    recorded_poses, replayed_poses = [], []
+    recorded_tick_times, replayed_tick_times = [], []
+    recorded_sent = []
+
+    for kind, elapsed, payload in log:
+        clock.now = log.start_time + elapsed
+
+        if kind in handlers:
+            topic, body = decode_message(payload)
+            handlers[kind](ctrl.client, None, FakeMessage(topic, bytes(body)))
+        elif kind == FLEET_STATE:
+            ctrl.merge_fleet_state(decode_fleet(payload))
+        elif kind == SENT:
+            recorded_sent.append(bytes(decode_message(payload)[1]).decode())
+        elif kind == TICK:
+            sensors = decode_sensors(payload)
+            if sensors:
+                for device, value in zip((ctrl.sensor_N, ctrl.sensor_E, ctrl.sensor_S, ctrl.sensor_W), sensors):
+                    device.value = value
+            tick_start = time.perf_counter()
+            ctrl.move_to_target()
+            ctrl.send_status()
+            replayed_tick_times.append(time.perf_counter() - tick_start)
+            pos = ctrl.trans.getSFVec3f()
+            replayed_poses.append((pos[0], pos[1]))
+        elif kind == POSE_RECORD:
+            _, x, y, tick_seconds, _ = decode_pose(payload)
+            recorded_poses.append((x, y))
+            recorded_tick_times.append(tick_seconds)
+
+    return {
+        "ticks": len(replayed_poses),
+        "recorded_poses": recorded_poses,
+        "replayed_poses": replayed_poses,
+        "recorded_tick_times": recorded_tick_times,
+        "replayed_tick_times": replayed_tick_times,
+        "recorded_path_length": path_length(recorded_poses, ctrl.STEP_SIZE),
+        "replayed_path_length": path_length(replayed_poses, ctrl.STEP_SIZE),
+        "recorded_sent": recorded_sent,
+        "replayed_sent": [message for _, message in ctrl.client.published],
+    }
+
+
+def _summary(times):
+    if not times:
+        return "-"
+    return f"gem {sum(times) / len(times) * 1000:.3f} ms, max {max(times) * 1000:.3f} ms"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Speel een robotopname offline opnieuw af")
+    parser.add_argument("recording", help="Pad naar het opnamebestand")
+    parser.add_argument("--controller", default=CONTROLLER_PATH,
+                        help="Controllerbestand om tegen af te spelen (standaard: basic_controller.py)")
+    args = parser.parse_args(argv)
+
+    report = replay(args.recording, args.controller)
+
+    print(f"Robot {report['robot_id']}, seed {report['seed']}, {report['ticks']} ticks")
+    print(f"Padlengte:  opname {report['recorded_path_length']}, herhaling {report['replayed_path_length']}")
+    print(f"Ticktijd:   opname {_summary(report['recorded_tick_times'])}")
+    print(f"            herhaling {_summary(report['replayed_tick_times'])}")
+    if report["first_divergence"] is None:
+        print("Posities:   identiek aan opname")
+    else:
+        print(f"Posities:   wijken af vanaf tick {report['first_divergence']}")
+    sent_equal = report["recorded_sent"] == report["replayed_sent"]
+    print(f"Berichten:  {len(report['recorded_sent'])} opgenomen, {len(report['replayed_sent'])} herhaald"
+          f"{'' if sent_equal else ' (verschillend)'}")
+
+    return 0 if report["first_divergence"] is None and sent_equal else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())